@@ -1,5 +1,13 @@
 import streamlit as st
-from src.utils import get_available_models, load_model, get_available_devices
+import os
+from src.utils import (
+    get_available_models,
+    load_model,
+    get_available_devices,
+    get_available_backends,
+    get_export_path,
+    supports_fast_fp16
+)
 from src.image_processing import process_image
 from src.video_processing import process_video_file
 import torch
@@ -48,37 +56,53 @@ with st.sidebar:
     
     # In the sidebar, when GPU is selected
     if "cuda" in selected_device:
+        backend = st.selectbox(
+            "Inference backend",
+            options=get_available_backends(),
+            index=0,
+            help="TensorRT and ONNX Runtime export the model on first use and reuse the export afterwards"
+        )
+        
+        fast_fp16 = supports_fast_fp16(selected_device)
         use_half_precision = st.checkbox(
             "Use half precision (FP16)", 
-            value=True,
-            help="Faster inference with slightly lower precision"
+            value=fast_fp16,
+            disabled=not fast_fp16,
+            help="Faster inference with slightly lower precision" if fast_fp16 else
+                 "Disabled: this GPU (Pascal or older) gets no speedup from FP16"
         )
         
+        compile_model = False
+        if backend == "PyTorch":
+            compile_model = st.checkbox(
+                "Compile model (torch.compile)",
+                value=False,
+                help="Captures the model in CUDA graphs for lower per-frame overhead. "
+                     "The first load pays a one-time compile cost, and each new batch size recompiles."
+            )
+        
+        export_path = get_export_path(model_path, selected_device, use_half_precision, backend)
+        if export_path is not None and not os.path.exists(export_path):
+            loading_message = f"Exporting model for {backend} (one-time, this can take 30-60 seconds)..."
+        elif compile_model:
+            loading_message = "Compiling model (one-time, this can take a while)..."
+        else:
+            loading_message = "Loading model..."
+        
         # Update model loading
-        with st.spinner("Loading model..."):
+        with st.spinner(loading_message):
             try:
-                model = load_model(model_path, device=selected_device)
-                
-                # Handle half precision
-                if use_half_precision:
-                    # Convert model to half precision
-                    if hasattr(model, 'model'):
-                        model.model.half()
-                        # Set a flag to indicate half precision is being used
-                        model.model.fp16 = True
-                        
-                        # Force a small inference to ensure model is properly converted
-                        import numpy as np
-                        dummy = np.zeros((100, 100, 3), dtype=np.uint8)
-                        with torch.no_grad():
-                            model(dummy, half=True)
-                else:
-                    # Ensure model is in full precision
-                    if hasattr(model, 'model'):
-                        # Set flag to indicate full precision
-                        model.model.fp16 = False
+                # Models are cached per precision and backend, so toggling FP16 doesn't reload
+                model = load_model(
+                    model_path,
+                    device=selected_device,
+                    half=use_half_precision,
+                    backend=backend,
+                    compile_model=compile_model
+                )
                 
                 st.success(f"Model loaded successfully on {selected_device}" + 
+                          (f" with {backend}" if backend != "PyTorch" else "") +
                           (" with half precision" if use_half_precision else ""))
             except Exception as e:
                 st.error(f"Error loading model: {e}")
@@ -109,14 +133,6 @@ with st.sidebar:
     conf_threshold = st.slider("Confidence threshold", 0.1, 1.0, 0.5, 0.05)
     show_labels = st.checkbox("Show labels on image/video", value=True)
     show_conf = st.checkbox("Show confidence scores", value=True)
-    
-    # Video processing options
-    st.subheader("Video Options")
-    process_every_nth_frame = st.slider(
-        "Process every Nth frame", 
-        1, 10, 1, 1, 
-        help="Only run detection on every Nth frame to speed up processing. Higher values = faster processing but may miss fast-moving objects. The output video will maintain the original frame rate."
-    )
 
 # Input selection - choose between image and video
 input_type = st.radio("Select input type", ["Image", "Video"])
@@ -124,7 +140,10 @@ input_type = st.radio("Select input type", ["Image", "Video"])
 if input_type == "Image":
     process_image(model, conf_threshold, show_labels, show_conf)
 else:  # Video processing
-    process_video_file(model, conf_threshold, show_labels, show_conf, process_every_nth_frame)
+    process_video_file(
+        model, conf_threshold, show_labels, show_conf,
+        default_batch_size=8 if "cuda" in selected_device else 1
+    )
 
 # Add footer
 st.markdown("---")
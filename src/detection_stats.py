@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Numba is optional; without it the statistics are updated with NumPy calls
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+STATS_COLUMNS = ['Class', 'Count', 'Avg_Confidence', 'Min_Confidence', 'Max_Confidence', 'First_Seen', 'Last_Seen']
+
+def accumulate_detections(cls_ids, confs, time, count, conf_sum, conf_min, conf_max, first_seen, last_seen):
+    """
+    Add one frame's detections to the per-class arrays in a single pass
+    
+    Compiled with Numba when it is installed, which replaces the handful of
+    NumPy calls per frame with one loop in machine code.
+    
+    Args:
+        cls_ids: Integer array of class IDs
+        confs: Array of confidence scores
+        time: Frame timestamp in seconds
+        count, conf_sum, conf_min, conf_max, first_seen, last_seen: Per-class arrays, updated in place
+    """
+    for i in range(len(cls_ids)):
+        cls_id = cls_ids[i]
+        conf = confs[i]
+        count[cls_id] += 1
+        conf_sum[cls_id] += conf
+        if conf < conf_min[cls_id]:
+            conf_min[cls_id] = conf
+        if conf > conf_max[cls_id]:
+            conf_max[cls_id] = conf
+        if time < first_seen[cls_id]:
+            first_seen[cls_id] = time
+        if time > last_seen[cls_id]:
+            last_seen[cls_id] = time
+
+if njit is not None:
+    accumulate_detections = njit(cache=True)(accumulate_detections)
+
+class DetectionStats:
+    """
+    Per-class detection statistics, updated incrementally as frames are processed
+    
+    Only a handful of numbers per class are kept, so memory does not grow with the
+    number of detections in the video.
+    """
+    
+    def __init__(self, class_names):
+        """
+        Args:
+            class_names: List of class names indexed by class ID
+        """
+        self.class_names = list(class_names)
+        num_classes = len(self.class_names)
+        self.count = np.zeros(num_classes, dtype=np.int64)
+        self.conf_sum = np.zeros(num_classes, dtype=np.float64)
+        self.conf_min = np.full(num_classes, np.inf)
+        self.conf_max = np.full(num_classes, -np.inf)
+        self.first_seen = np.full(num_classes, np.inf)
+        self.last_seen = np.full(num_classes, -np.inf)
+    
+    def _grow(self, num_classes):
+        """
+        Extend the per-class arrays for class IDs the model's names don't cover
+        
+        Args:
+            num_classes: New number of classes
+        """
+        extra = num_classes - len(self.count)
+        self.class_names += [f"Class {cls_id}" for cls_id in range(len(self.count), num_classes)]
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.conf_sum = np.concatenate([self.conf_sum, np.zeros(extra)])
+        self.conf_min = np.concatenate([self.conf_min, np.full(extra, np.inf)])
+        self.conf_max = np.concatenate([self.conf_max, np.full(extra, -np.inf)])
+        self.first_seen = np.concatenate([self.first_seen, np.full(extra, np.inf)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(extra, -np.inf)])
+    
+    def update(self, cls_ids, confs, time):
+        """
+        Add the detections of one frame
+        
+        Args:
+            cls_ids: Integer array of class IDs
+            confs: Array of confidence scores
+            time: Frame timestamp in seconds
+        """
+        if len(cls_ids) == 0:
+            return
+        if cls_ids.max() >= len(self.count):
+            self._grow(int(cls_ids.max()) + 1)
+        
+        if njit is not None:
+            accumulate_detections(
+                cls_ids, confs, float(time), self.count, self.conf_sum, self.conf_min, self.conf_max,
+                self.first_seen, self.last_seen
+            )
+            return
+        
+        num_classes = len(self.count)
+        self.count += np.bincount(cls_ids, minlength=num_classes)
+        self.conf_sum += np.bincount(cls_ids, weights=confs, minlength=num_classes)
+        np.minimum.at(self.conf_min, cls_ids, confs)
+        np.maximum.at(self.conf_max, cls_ids, confs)
+        
+        seen = np.unique(cls_ids)
+        self.first_seen[seen] = np.minimum(self.first_seen[seen], time)
+        self.last_seen[seen] = np.maximum(self.last_seen[seen], time)
+    
+    def to_dataframe(self):
+        """
+        Build the formatted per-class statistics table
+        
+        Returns:
+            DataFrame: One row per detected class, sorted by class name
+        """
+        seen = np.flatnonzero(self.count)
+        if len(seen) == 0:
+            return pd.DataFrame(columns=STATS_COLUMNS)
+        
+        class_stats = pd.DataFrame({
+            'Class': np.array(self.class_names, dtype=object)[seen],
+            'Count': self.count[seen],
+            'Avg_Confidence': self.conf_sum[seen] / self.count[seen],
+            'Min_Confidence': self.conf_min[seen],
+            'Max_Confidence': self.conf_max[seen],
+            'First_Seen': self.first_seen[seen],
+            'Last_Seen': self.last_seen[seen]
+        }).sort_values('Class', ignore_index=True)
+        
+        # Format the values
+        class_stats['Avg_Confidence'] = class_stats['Avg_Confidence'].map("{:.2f}".format)
+        class_stats['Min_Confidence'] = class_stats['Min_Confidence'].map("{:.2f}".format)
+        class_stats['Max_Confidence'] = class_stats['Max_Confidence'].map("{:.2f}".format)
+        class_stats['First_Seen'] = class_stats['First_Seen'].map("{:.1f}s".format)
+        class_stats['Last_Seen'] = class_stats['Last_Seen'].map("{:.1f}s".format)
+        
+        return class_stats
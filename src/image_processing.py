@@ -1,10 +1,13 @@
 import streamlit as st
-import tempfile
-import os
 import cv2
+import numpy as np
 import pandas as pd
+import torch
 from PIL import Image
 
+from src.frame_preprocessing import frames_to_blob, restore_result
+from src.utils import get_class_names, get_model_device, uses_half_precision
+
 def process_image(model, conf_threshold, show_labels, show_conf):
     """
     Process image with object detection
@@ -15,6 +18,9 @@ def process_image(model, conf_threshold, show_labels, show_conf):
         show_labels: Whether to show labels
         show_conf: Whether to show confidence scores
     """
+    # Get class names from model once, indexed by class ID
+    class_names = get_class_names(model)
+    
     # File uploader for images
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
     
@@ -24,68 +30,59 @@ def process_image(model, conf_threshold, show_labels, show_conf):
         
         with col1:
             st.subheader("Original Image")
+            uploaded_file.seek(0)
             image = Image.open(uploaded_file)
             st.image(image, caption="Uploaded Image", use_column_width=True)
         
-        # Create a temporary file to save the uploaded image
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            img_path = tmp_file.name
-        
         # Run inference
         with st.spinner("Detecting objects..."):
-            # Load image with OpenCV (BGR format)
-            cv_image = cv2.imread(img_path)
-            # Convert to RGB for the model
-            rgb_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-            # Run detection
-            results = model(rgb_image, conf=conf_threshold)
+            # Decode the uploaded bytes in memory with OpenCV (BGR format)
+            cv_image = cv2.imdecode(np.frombuffer(uploaded_file.getbuffer(), dtype=np.uint8), cv2.IMREAD_COLOR)
+            # Letterbox, convert to RGB CHW and normalize in a single OpenCV pass
+            blob, letterbox_params = frames_to_blob([cv_image])
+            # Run detection without autograd bookkeeping
+            with torch.inference_mode():
+                tensor = torch.from_numpy(blob).to(get_model_device(model))
+                results = model(tensor, conf=conf_threshold, half=uses_half_precision(model))
         
         # Display results
         with col2:
             st.subheader("Detection Results")
-            # Get the first result (only one image)
-            result = results[0]
-            # Plot the result (returns RGB image)
+            # Get the first result (only one image) in original image coordinates
+            ratio, pad = letterbox_params[0]
+            result = restore_result(results[0], cv_image, ratio, pad)
+            # Plot the result on the original image (returns BGR image)
             res_plotted = result.plot(conf=show_conf, labels=show_labels, line_width=2)
-            # Display the RGB image directly with Streamlit
-            st.image(res_plotted, caption="Detection Result", use_column_width=True)
+            # Display the BGR image with Streamlit
+            st.image(res_plotted, caption="Detection Result", channels="BGR", use_column_width=True)
         
         # Display detection details
         st.subheader("Detection Details")
         
         if len(result.boxes) > 0:
-            # Create a table with detection details
+            # Pull all boxes off the device once as arrays
             boxes = result.boxes.cpu().numpy()
+            cls_ids = boxes.cls.astype(int)
+            xyxy = boxes.xyxy.astype(int)  # Box coordinates [x1, y1, x2, y2]
             
-            # Create a DataFrame for better display
-            detections_data = []
-            
-            for i, box in enumerate(boxes):
-                cls_id = int(box.cls[0])
-                # Get class name from model or use index if not available
-                class_name = model.names.get(cls_id, f"Class {cls_id}") if hasattr(model, 'names') else f"Class {cls_id}"
-                conf = float(box.conf[0])
-                coords = box.xyxy[0].tolist()  # Get box coordinates [x1, y1, x2, y2]
-                
-                detections_data.append({
-                    "ID": i+1,
-                    "Class": class_name,
-                    "Confidence": f"{conf:.2f}",
-                    "Location": f"[{int(coords[0])}, {int(coords[1])}, {int(coords[2])}, {int(coords[3])}]"
-                })
+            # Create a DataFrame for better display, column by column
+            df = pd.DataFrame({
+                "ID": np.arange(1, len(cls_ids) + 1),
+                "Class": [
+                    class_names[cls_id] if cls_id < len(class_names) else f"Class {cls_id}"
+                    for cls_id in cls_ids.tolist()
+                ],
+                "Confidence": np.char.mod("%.2f", boxes.conf),
+                "Location": [str(coords) for coords in xyxy.tolist()]
+            })
             
             # Display as a styled table
-            if detections_data:
-                df = pd.DataFrame(detections_data)
+            if not df.empty:
                 st.dataframe(df, use_container_width=True)
                 
                 # Summary statistics
                 st.subheader("Detection Summary")
-                class_counts = {}
-                for item in detections_data:
-                    class_name = item["Class"]
-                    class_counts[class_name] = class_counts.get(class_name, 0) + 1
+                class_counts = df["Class"].value_counts(sort=False)
                 
                 # Create metrics for each detected class
                 cols = st.columns(min(len(class_counts), 4))  # Up to 4 columns
@@ -107,8 +104,5 @@ def process_image(model, conf_threshold, show_labels, show_conf):
                     st.json(result.tojson())
         else:
             st.info("No objects detected in the image.")
-        
-        # Clean up the temporary file
-        os.unlink(img_path)
     else:
         st.info("Please upload an image to get started.")
\ No newline at end of file
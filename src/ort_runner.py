@@ -0,0 +1,119 @@
+import ast
+import numpy as np
+import onnxruntime as ort
+import torch
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+
+# Strides of the YOLO detection head outputs (P3, P4, P5)
+DETECT_STRIDES = (8, 16, 32)
+
+class OrtYOLO:
+    """
+    Run an exported YOLO detection model with ONNX Runtime's CUDA execution provider
+    
+    Inputs and outputs stay on the GPU through IO binding, and the output buffer is
+    reused between calls of the same shape. Calling the model mirrors the parts of
+    the Ultralytics YOLO interface this app uses: it takes a normalized (B, 3, H, W)
+    tensor and returns Results objects. The results carry a placeholder image, so
+    callers map them back onto their frames with restore_result.
+    """
+    
+    def __init__(self, onnx_path, device='cuda:0'):
+        """
+        Args:
+            onnx_path: Path to the exported .onnx model
+            device: CUDA device to run on ('cuda:0', etc.)
+        """
+        self.device = torch.device(device)
+        device_id = self.device.index or 0
+        providers = [
+            ('CUDAExecutionProvider', {
+                'device_id': device_id,
+                # Grow the memory arena by exactly what is requested instead of doubling
+                'arena_extend_strategy': 'kSameAsRequested'
+            }),
+            'CPUExecutionProvider'
+        ]
+        self.session = ort.InferenceSession(onnx_path, providers=providers)
+        
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if metadata.get('task', 'detect') != 'detect':
+            raise ValueError("The ONNX Runtime backend only supports detection models")
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+        
+        model_input = self.session.get_inputs()[0]
+        model_output = self.session.get_outputs()[0]
+        self.input_name = model_input.name
+        self.output_name = model_output.name
+        self.fp16 = model_input.type == 'tensor(float16)'
+        self.dtype = torch.float16 if self.fp16 else torch.float32
+        self.element_type = np.float16 if self.fp16 else np.float32
+        self.output_channels = 4 + len(self.names)
+        self.output_buffer = None
+    
+    def _get_output_buffer(self, batch_size, height, width):
+        """
+        Get a preallocated GPU output tensor for an input shape
+        
+        Args:
+            batch_size: Number of images in the batch
+            height: Input height
+            width: Input width
+            
+        Returns:
+            torch.Tensor: (batch_size, 4 + num_classes, num_anchors) tensor
+        """
+        num_anchors = sum((height // stride) * (width // stride) for stride in DETECT_STRIDES)
+        shape = (batch_size, self.output_channels, num_anchors)
+        if self.output_buffer is None or tuple(self.output_buffer.shape) != shape:
+            self.output_buffer = torch.empty(shape, dtype=self.dtype, device=self.device)
+        return self.output_buffer
+    
+    def __call__(self, source, conf=0.25, iou=0.7, max_det=300, **kwargs):
+        """
+        Run detection on a preprocessed batch
+        
+        Args:
+            source: Normalized (B, 3, H, W) tensor in RGB order
+            conf: Confidence threshold
+            iou: IoU threshold for non-maximum suppression
+            max_det: Maximum detections per image
+            **kwargs: Other Ultralytics predict arguments, ignored
+            
+        Returns:
+            list: One Ultralytics Results object per image
+        """
+        batch = source.to(self.device, self.dtype).contiguous()
+        batch_size, _, height, width = batch.shape
+        output = self._get_output_buffer(batch_size, height, width)
+        
+        binding = self.session.io_binding()
+        binding.bind_input(
+            self.input_name, 'cuda', self.device.index or 0, self.element_type,
+            tuple(batch.shape), batch.data_ptr()
+        )
+        binding.bind_output(
+            self.output_name, 'cuda', self.device.index or 0, self.element_type,
+            tuple(output.shape), output.data_ptr()
+        )
+        
+        # ONNX Runtime uses its own CUDA stream, so torch's pending work must finish first
+        torch.cuda.current_stream(self.device).synchronize()
+        self.session.run_with_iobinding(binding)
+        
+        # Non-maximum suppression on the GPU (torchvision.ops.nms under the hood)
+        detections = ops.non_max_suppression(output.float(), conf, iou, max_det=max_det)
+        
+        # Zero-stride placeholder with the input shape, replaced by restore_result
+        placeholder = np.broadcast_to(np.uint8(0), (height, width, 3))
+        return [
+            Results(placeholder, path="", names=self.names, boxes=det[:, :6])
+            for det in detections
+        ]
+    
+    def predict(self, source, **kwargs):
+        """
+        Alias of calling the model, like Ultralytics YOLO.predict
+        """
+        return self(source, **kwargs)
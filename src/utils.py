@@ -1,10 +1,23 @@
 
 import streamlit as st
 import os
-import glob
+import importlib.util
+
+# Let the CUDA caching allocator grow segments instead of fragmenting when the
+# input resolution changes between videos. Must be set before torch is imported.
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
 from ultralytics import YOLO
 import torch
 
+# Video frames all share one input shape, so let cuDNN pick the fastest kernels for it
+torch.backends.cudnn.benchmark = True
+
+# Largest batch the video pipeline sends to the model; TensorRT engines are built for it
+MAX_BATCH_SIZE = 16
+# Batch sizes offered for video processing: powers of two up to MAX_BATCH_SIZE
+BATCH_SIZE_OPTIONS = [2 ** i for i in range(MAX_BATCH_SIZE.bit_length())]
+
 def get_available_models():
     """
     Find available YOLO model files in the current directory and subdirectories
@@ -12,17 +25,14 @@ def get_available_models():
     Returns:
         dict: Dictionary with model name as key and path as value
     """
-    # Look for .pt files in the current directory and subdirectories
-    model_files = glob.glob("*.pt") + glob.glob("**/*.pt", recursive=True)
-    
-    # Filter out any checkpoint files
-    model_files = [f for f in model_files if not "checkpoint" in f.lower()]
-    
-    # Create a dictionary with model name as key and path as value
     models_dict = {}
-    for model_path in model_files:
-        model_name = os.path.basename(model_path)
-        models_dict[model_name] = model_path
+    # Walk the tree once, skipping hidden directories (.git, .venv, ...)
+    for root, dirs, files in os.walk("."):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file_name in sorted(files):
+            # Filter out any checkpoint files
+            if file_name.endswith(".pt") and "checkpoint" not in file_name.lower():
+                models_dict[file_name] = os.path.normpath(os.path.join(root, file_name))
     
     return models_dict
 
@@ -39,39 +49,312 @@ def get_available_devices():
             devices.append(f"cuda:{i}")
     return devices
 
-def warmup_gpu(model):
+def supports_fast_fp16(device):
+    """
+    Check whether a CUDA device gets a speedup from half precision
+    
+    Pascal and older GPUs (compute capability < 7.0) have no tensor cores and
+    see no gain, or a slowdown, from FP16 inference.
+    
+    Args:
+        device: CUDA device ('cuda:0', etc.)
+        
+    Returns:
+        bool: True for Volta and newer GPUs
+    """
+    if 'cuda' not in device or not torch.cuda.is_available():
+        return False
+    major, _ = torch.cuda.get_device_capability(int(device.split(":")[-1]))
+    return major >= 7
+
+def get_available_backends():
+    """
+    Get inference backends that can be used on a CUDA device
+    
+    Returns:
+        list: List of backend names
+    """
+    backends = ["PyTorch"]
+    if importlib.util.find_spec("tensorrt") is not None:
+        backends.append("TensorRT")
+    if importlib.util.find_spec("onnxruntime") is not None:
+        backends.append("ONNX Runtime")
+    return backends
+
+def get_class_names(model):
+    """
+    Get the model's class names as a list indexed by class ID
+    
+    Looking names up once avoids a hasattr and dict lookup per detected box.
+    
+    Args:
+        model: YOLO model
+        
+    Returns:
+        list: Class names, with "Class N" for IDs the model doesn't name
+    """
+    names = getattr(model, 'names', None) or {}
+    return [names.get(i, f"Class {i}") for i in range(max(names, default=-1) + 1)]
+
+def get_model_device(model):
     """
-    Run a warmup inference to initialize GPU memory
+    Get the device a loaded model runs inference on
     
     Args:
         model: YOLO model
+        
+    Returns:
+        torch.device: Inference device
+    """
+    if isinstance(getattr(model, 'model', None), torch.nn.Module):
+        return next(model.model.parameters()).device
+    # Exported models (e.g. TensorRT engines) run on the predictor's device
+    predictor = getattr(model, 'predictor', None)
+    if predictor is not None and predictor.device is not None:
+        return predictor.device
+    # Runners such as OrtYOLO expose their device directly
+    device = getattr(model, 'device', None)
+    if isinstance(device, torch.device):
+        return device
+    return torch.device('cpu')
+
+def uses_half_precision(model):
+    """
+    Check whether a loaded model runs inference in half precision
+    
+    Args:
+        model: YOLO model
+        
+    Returns:
+        bool: True if the model uses FP16
     """
-    if hasattr(model, 'device') and 'cuda' in str(model.device):
-        import numpy as np
-        # Create a dummy image (3 channels, 640x640)
-        dummy_input = np.zeros((640, 640, 3), dtype=np.uint8)
+    torch_model = getattr(model, 'model', None)
+    if isinstance(torch_model, torch.nn.Module):
+        if hasattr(torch_model, 'fp16'):
+            return bool(torch_model.fp16)
+        # Check if any parameter is in half precision
+        return next(torch_model.parameters()).dtype == torch.float16
+    # Exported engines bake the precision in at build time
+    predictor = getattr(model, 'predictor', None)
+    if predictor is not None:
+        return bool(getattr(predictor.model, 'fp16', False))
+    return bool(getattr(model, 'fp16', False))
+
+def get_engine_path(model_path, device, half):
+    """
+    Get the path of the cached TensorRT engine for a model, device and precision
+    
+    Args:
+        model_path: Path to the .pt model file
+        device: CUDA device ('cuda:0', etc.)
+        half: Whether the engine uses FP16
+        
+    Returns:
+        str: Path to the engine file
+    """
+    device_tag = device.replace(":", "")
+    precision = "fp16" if half else "fp32"
+    return f"{model_path}.{device_tag}.{precision}.engine"
+
+def get_onnx_path(model_path, half):
+    """
+    Get the path of the cached ONNX export for a model and precision
+    
+    Args:
+        model_path: Path to the .pt model file
+        half: Whether the export uses FP16
+        
+    Returns:
+        str: Path to the .onnx file
+    """
+    precision = "fp16" if half else "fp32"
+    return f"{model_path}.{precision}.onnx"
+
+def get_export_path(model_path, device, half, backend):
+    """
+    Get the path of the cached export a backend loads
+    
+    Args:
+        model_path: Path to the .pt model file
+        device: CUDA device ('cuda:0', etc.)
+        half: Whether the export uses FP16
+        backend: Inference backend name
+        
+    Returns:
+        str: Path to the exported file, or None for the PyTorch backend
+    """
+    if backend == "TensorRT":
+        return get_engine_path(model_path, device, half)
+    if backend == "ONNX Runtime":
+        return get_onnx_path(model_path, half)
+    return None
+
+def get_or_export_onnx(model_path, device, half):
+    """
+    Export a model to ONNX once and reuse it on later runs
+    
+    Args:
+        model_path: Path to the .pt model file
+        device: CUDA device to export on, needed for FP16 ('cuda:0', etc.)
+        half: Whether to export in FP16
+        
+    Returns:
+        str: Path to the .onnx file
+    """
+    onnx_path = get_onnx_path(model_path, half)
+    if not os.path.exists(onnx_path):
+        # Dynamic axes so batched video frames and rectangular inputs share one export
+        exported_path = YOLO(model_path).export(
+            format="onnx",
+            half=half,
+            imgsz=640,
+            dynamic=True,
+            device=device.split(":")[-1],
+        )
+        os.replace(exported_path, onnx_path)
+    return onnx_path
+
+def get_or_build_engine(model_path, device, half):
+    """
+    Export a model to a TensorRT engine once and reuse it on later runs
+    
+    The first export takes 30-60 seconds; the engine is cached next to the .pt file.
+    
+    Args:
+        model_path: Path to the .pt model file
+        device: CUDA device ('cuda:0', etc.)
+        half: Whether to build an FP16 engine
+        
+    Returns:
+        str: Path to the engine file
+    """
+    engine_path = get_engine_path(model_path, device, half)
+    if not os.path.exists(engine_path):
+        # The export goes through an ONNX file next to the model, which is only an
+        # intermediate step; it is removed afterwards unless it was already there
+        onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+        keep_onnx = os.path.exists(onnx_path)
+        
+        # Dynamic batch axis so the same engine serves images and batched video frames
+        exported_path = YOLO(model_path).export(
+            format="engine",
+            half=half,
+            imgsz=640,
+            dynamic=True,
+            batch=MAX_BATCH_SIZE,
+            device=device.split(":")[-1],
+        )
+        os.replace(exported_path, engine_path)
+        if not keep_onnx and os.path.exists(onnx_path):
+            os.remove(onnx_path)
+    return engine_path
+
+def warmup_gpu(model, device=None, half=False, batch_size=1, input_shape=(640, 640), passes=3):
+    """
+    Run warmup inferences to initialize GPU memory and the cuDNN kernel cache
+    
+    Warming up with the same input shape used later primes cuDNN benchmark mode
+    and the caching allocator, so the first real frames are not slower.
+    
+    Args:
+        model: YOLO model
+        device: Device to warm up on (defaults to the model's device)
+        half: Whether the model runs in half precision
+        batch_size: Batch size of the warmup input
+        input_shape: (height, width) of the warmup input
+        passes: Number of warmup inferences
+    """
+    device = str(device or get_model_device(model))
+    if 'cuda' in device:
+        # Create a dummy batch (N, 3, H, W) like the video pipeline sends
+        dummy_input = torch.zeros((batch_size, 3, *input_shape), device=device)
         # Run inference to warm up GPU
-        with torch.no_grad():
-            model(dummy_input)
+        with torch.inference_mode():
+            for _ in range(passes):
+                model(dummy_input, device=device, half=half, verbose=False)
+
+def compile_predictor_model(model, half=False):
+    """
+    Compile the network the predictor runs with torch.compile (CUDA graphs)
+    
+    The predictor wraps the fused network in an AutoBackend when it is created,
+    so the model must have run once already and the compiled module has to
+    replace the one inside the predictor, not model.model.
+    
+    Args:
+        model: YOLO model that has already run an inference
+        half: Whether the model runs in half precision
+        
+    Returns:
+        bool: True if torch.compile produced a graph, otherwise the model is left uncompiled
+    """
+    from torch._dynamo.utils import counters
+    
+    backend = model.predictor.model
+    original_module = backend.model
+    graphs_before = counters["stats"]["unique_graphs"]
+    # CUDA graphs replay the whole forward pass with a single launch
+    backend.model = torch.compile(original_module, mode='reduce-overhead')
+    try:
+        # Compiles, then records and replays the graph (roughly 10 seconds or more)
+        warmup_gpu(model, half=half)
+    except Exception:
+        backend.model = original_module
+        return False
+    
+    if counters["stats"]["unique_graphs"] == graphs_before:
+        backend.model = original_module
+        return False
+    return True
 
 # Load the model
 @st.cache_resource
-def load_model(model_path, device='cpu'):
+def load_model(model_path, device='cpu', half=False, backend="PyTorch", compile_model=False):
     """
     Load a YOLO model with caching
     
+    The cache is keyed by path, device, precision, backend and compile flag, so
+    every combination is loaded, converted and warmed up only once per session.
+    
     Args:
         model_path: Path to the model file
         device: Device to run inference on ('cpu', 'cuda:0', etc.)
+        half: Whether to run in half precision (CUDA only)
+        backend: Inference backend ("PyTorch", "TensorRT" or "ONNX Runtime")
+        compile_model: Whether to compile the PyTorch model with torch.compile (CUDA only)
         
     Returns:
-        YOLO: Loaded model
+        YOLO: Loaded model (an OrtYOLO runner for ONNX Runtime)
     """
-    # Load model in full precision first
+    half = half and 'cuda' in device
+    
+    if backend == "TensorRT" and 'cuda' in device:
+        # The engine bakes in device and precision, so no conversion is needed
+        model = YOLO(get_or_build_engine(model_path, device, half))
+        warmup_gpu(model, device, half=half)
+        return model
+    
+    if backend == "ONNX Runtime" and 'cuda' in device:
+        # Imported lazily because onnxruntime is an optional dependency
+        from src.ort_runner import OrtYOLO
+        model = OrtYOLO(get_or_export_onnx(model_path, device, half), device)
+        warmup_gpu(model, device, half=half)
+        return model
+    
     model = YOLO(model_path).to(device)
     
-    # Run a warmup inference in full precision
-    warmup_gpu(model)
+    if half:
+        # Convert model to half precision
+        model.model.half()
+    # Flag the precision so inference passes the matching half argument
+    model.model.fp16 = half
+    
+    # Run a warmup inference in the chosen precision. Passing half here matters:
+    # the predictor created by the first call converts the weights to match it.
+    warmup_gpu(model, half=half)
+    
+    if compile_model and 'cuda' in device and hasattr(torch, 'compile'):
+        if not compile_predictor_model(model, half=half):
+            st.warning("torch.compile did not compile the model, running it uncompiled")
     
     return model
-
@@ -1,9 +1,47 @@
 import cv2
-import os
+import subprocess
+import tempfile
 from stqdm import stqdm
 import streamlit as st
 
-def compress_video(input_path, output_path, resolution=480, quality=23, fps=None):
+from src.video_utils import is_nvenc_available, read_ffmpeg_log
+
+def run_ffmpeg_with_progress(cmd, total_frames):
+    """
+    Run an FFmpeg command that reports progress on stdout ("-progress pipe:1")
+    
+    Args:
+        cmd: FFmpeg command line
+        total_frames: Expected number of output frames, for the progress bar
+        
+    Returns:
+        tuple: (success, stderr output)
+    """
+    # Errors go to a temporary file: only stdout is read while FFmpeg runs, and a
+    # stderr pipe nobody drains could fill up and block it
+    with tempfile.TemporaryFile() as log_file:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=log_file,
+            universal_newlines=True
+        )
+        
+        # Drive the progress bar from FFmpeg's "frame=N" progress lines
+        progress_bar = stqdm(total=total_frames, desc="Compressing video")
+        frames_done = 0
+        for line in process.stdout:
+            if line.startswith("frame="):
+                frame = int(line.split("=", 1)[1])
+                progress_bar.update(max(frame - frames_done, 0))
+                frames_done = max(frame, frames_done)
+        progress_bar.close()
+        
+        process.communicate()
+        ffmpeg_errors = read_ffmpeg_log(log_file)
+    return process.returncode == 0, ffmpeg_errors
+
+def compress_video(input_path, output_path, resolution=480, quality=23, fps=None, use_hwaccel=False):
     """
     Compress video to reduce processing time
     
@@ -13,6 +51,7 @@ def compress_video(input_path, output_path, resolution=480, quality=23, fps=None
         resolution: Target height (width will be calculated to maintain aspect ratio)
         quality: FFmpeg CRF value (0-51, lower means better quality, 23 is default)
         fps: Target FPS (None means keep original)
+        use_hwaccel: Decode, scale and encode on an NVIDIA GPU (NVENC) when available
     
     Returns:
         bool: Success or failure
@@ -26,8 +65,9 @@ def compress_video(input_path, output_path, resolution=480, quality=23, fps=None
         # Get original video properties
         orig_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         orig_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        orig_fps = int(cap.get(cv2.CAP_PROP_FPS))
+        orig_fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
         
         # Calculate new dimensions while maintaining aspect ratio
         if orig_height > resolution:
@@ -38,30 +78,68 @@ def compress_video(input_path, output_path, resolution=480, quality=23, fps=None
             new_width = orig_width
             new_height = orig_height
         
-        # Use original fps if not specified
-        target_fps = fps if fps is not None else orig_fps
+        # H.264 with yuv420p needs even dimensions
+        new_width, new_height = new_width // 2 * 2, new_height // 2 * 2
         
-        # Create VideoWriter
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, target_fps, (new_width, new_height))
+        # Resize (and drop frames, if a lower FPS was requested) inside FFmpeg
+        drop_fps = fps is not None and orig_fps > 0 and fps < orig_fps
+        if drop_fps:
+            total_frames = int(total_frames * fps / orig_fps)
         
-        # Process frames with progress bar
-        for _ in stqdm(range(total_frames), desc="Compressing video"):
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            # Resize frame
-            resized_frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
-            # Write frame
-            out.write(resized_frame)
+        if use_hwaccel and is_nvenc_available():
+            # Decode, scale and encode on the GPU; frames never leave GPU memory
+            filters = [f"scale_cuda={new_width}:{new_height}"]
+            if drop_fps:
+                filters.append(f"fps={fps}")
+            cmd = [
+                'ffmpeg',
+                '-loglevel', 'error',
+                '-hwaccel', 'cuda',                  # NVDEC decoding
+                '-hwaccel_output_format', 'cuda',    # Keep decoded frames on the GPU
+                '-i', input_path,
+                '-vf', ",".join(filters),
+                '-an',
+                '-c:v', 'h264_nvenc',                # NVENC H.264 encoder
+                '-preset', 'p4',
+                '-rc', 'vbr',
+                '-cq', str(quality),                 # Constant quality, comparable to CRF
+                '-b:v', '0',
+                '-progress', 'pipe:1',
+                '-y',
+                output_path
+            ]
+            success, stderr = run_ffmpeg_with_progress(cmd, total_frames)
+            if success:
+                return True
+            # Not every input codec or FFmpeg build supports the full GPU path
+            st.warning("Hardware accelerated compression failed, falling back to the CPU encoder.")
         
-        # Release resources
-        cap.release()
-        out.release()
+        filters = [f"scale={new_width}:{new_height}:flags=area"]
+        if drop_fps:
+            filters.append(f"fps={fps}")
+        
+        # libswscale and libx264 use all CPU cores with SIMD, unlike a Python frame loop.
+        # Only one upload is compressed at a time, so the encoder keeps its default thread count.
+        cmd = [
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-i', input_path,              # Input file
+            '-vf', ",".join(filters),      # Scale and FPS filters
+            '-an',                         # Detection doesn't need audio
+            '-c:v', 'libx264',             # H.264 codec
+            '-preset', 'fast',             # Encoding speed/compression tradeoff
+            '-crf', str(quality),          # Constant Rate Factor (quality) - lower is better
+            '-pix_fmt', 'yuv420p',         # Pixel format for maximum compatibility
+            '-progress', 'pipe:1',         # Machine-readable progress on stdout
+            '-y',                          # Overwrite output file if it exists
+            output_path                    # Output file
+        ]
+        success, stderr = run_ffmpeg_with_progress(cmd, total_frames)
+        if not success:
+            st.error(f"Error compressing video: {stderr}")
+            return False
         
         return True
     except Exception as e:
         st.error(f"Error compressing video: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -1,12 +1,258 @@
 import cv2
+import numpy as np
+import torch
 import tempfile
-import os
-import pandas as pd
+import time
+import queue
+import threading
 import streamlit as st
 from stqdm import stqdm
-import subprocess
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+from ultralytics.utils.plotting import colors
 
-def process_video(video_path, model, conf_threshold, show_labels, show_conf, process_every_nth_frame=1, batch_size=1):
+from src.video_utils import clean_up_temp_file, open_ffmpeg_writer, open_nvdec_capture, read_ffmpeg_log
+from src.frame_preprocessing import (
+    PinnedFrameUploader,
+    frames_to_blob,
+    letterbox_shape,
+    motion_thumbnail,
+    restore_result
+)
+from src.detection_stats import DetectionStats
+from src.utils import get_class_names, get_model_device, uses_half_precision, warmup_gpu
+
+# Frames buffered between the decode, inference and encode stages
+FRAME_QUEUE_SIZE = 16
+# How often (in seconds) blocked queue operations check whether processing was stopped
+QUEUE_POLL_INTERVAL = 0.1
+# Minimum time (in seconds) between progress message updates
+PROGRESS_UPDATE_INTERVAL = 0.5
+# Upper bound on the memory used by frames waiting for their batch to run
+MAX_PENDING_BYTES = 1 << 30
+
+def build_annotations(boxes, class_names, class_colors, show_labels, show_conf):
+    """
+    Extract the drawable parts of a detection result once so they can be reused on later frames
+    
+    Args:
+        boxes: Ultralytics Boxes object on the CPU as NumPy arrays
+        class_names: List of class names indexed by class ID
+        class_colors: List of BGR colors indexed by class ID
+        show_labels: Whether to show labels
+        show_conf: Whether to show confidence scores
+        
+    Returns:
+        list: (top_left, bottom_right, label, color) tuples, label is None when hidden
+    """
+    annotations = []
+    num_classes = len(class_names)
+    rows = zip(boxes.xyxy.astype(int).tolist(), boxes.cls.astype(int).tolist(), boxes.conf.tolist())
+    for (x1, y1, x2, y2), cls_id, conf in rows:
+        known_class = cls_id < num_classes
+        if show_labels:
+            name = class_names[cls_id] if known_class else f"Class {cls_id}"
+            label = f"{name} {conf:.2f}" if show_conf else name
+        else:
+            label = None
+        color = class_colors[cls_id] if known_class else colors(cls_id, True)
+        annotations.append(((x1, y1), (x2, y2), label, color))
+    return annotations
+
+def draw_annotations(frame, annotations, line_width=2):
+    """
+    Draw cached boxes and labels onto a frame in place with OpenCV
+    
+    Args:
+        frame: BGR frame to draw on
+        annotations: List returned by build_annotations
+        line_width: Box line width in pixels
+        
+    Returns:
+        numpy.ndarray: The same frame, annotated
+    """
+    font_scale = line_width / 3
+    font_thickness = max(line_width - 1, 1)
+    for p1, p2, label, color in annotations:
+        cv2.rectangle(frame, p1, p2, color, line_width, lineType=cv2.LINE_AA)
+        if label:
+            # Filled label background above the box (or inside it at the top edge)
+            (text_w, text_h), _ = cv2.getTextSize(label, 0, font_scale, font_thickness)
+            outside = p1[1] >= text_h + 3
+            label_p2 = (p1[0] + text_w, p1[1] - text_h - 3 if outside else p1[1] + text_h + 3)
+            cv2.rectangle(frame, p1, label_p2, color, -1, cv2.LINE_AA)
+            text_org = (p1[0], p1[1] - 2 if outside else p1[1] + text_h + 2)
+            cv2.putText(frame, label, text_org, 0, font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA)
+    return frame
+
+def predict_batch(model, batch, conf_threshold, half=False):
+    """
+    Run detection on a preprocessed batch
+    
+    For batches already on the GPU, the Ultralytics predictor would copy the whole
+    batch back to the host as its "original images", which restore_result replaces
+    anyway. So the predictor's network and non-maximum suppression are called
+    directly instead, like OrtYOLO does.
+    
+    Args:
+        model: YOLO model (or OrtYOLO runner)
+        batch: Normalized (B, 3, H, W) tensor in RGB order
+        conf_threshold: Confidence threshold
+        half: Whether the model runs in half precision
+        
+    Returns:
+        list: One Ultralytics Results object per image, in letterboxed coordinates
+    """
+    predictor = getattr(model, 'predictor', None)
+    if predictor is None or not batch.is_cuda or getattr(model, 'task', None) != 'detect':
+        return model(batch, conf=conf_threshold, half=half)
+    
+    backend = predictor.model
+    preds = backend(batch)
+    detections = ops.non_max_suppression(
+        preds,
+        conf_threshold,
+        predictor.args.iou,
+        max_det=predictor.args.max_det,
+        nc=len(backend.names),
+        end2end=getattr(backend, 'end2end', False)
+    )
+    
+    # Zero-stride placeholder with the input shape, replaced by restore_result
+    placeholder = np.broadcast_to(np.uint8(0), (batch.shape[2], batch.shape[3], 3))
+    return [
+        Results(placeholder, path="", names=backend.names, boxes=det[:, :6])
+        for det in detections
+    ]
+
+def queue_put(frame_queue, item, stop_event):
+    """
+    Put an item on a bounded queue, giving up if processing is stopped
+    
+    Args:
+        frame_queue: Queue to put the item on
+        item: Item to put
+        stop_event: Event set when processing should stop early
+        
+    Returns:
+        bool: True if the item was queued
+    """
+    while not stop_event.is_set():
+        try:
+            frame_queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def queue_get(frame_queue, stop_event):
+    """
+    Get an item from a queue, giving up if processing is stopped
+    
+    Args:
+        frame_queue: Queue to get the item from
+        stop_event: Event set when processing should stop early
+        
+    Returns:
+        object: The item, or None if processing was stopped
+    """
+    while not stop_event.is_set():
+        try:
+            return frame_queue.get(timeout=QUEUE_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return None
+
+def read_frames(cap, frame_queue, stop_event, errors, free_frames):
+    """
+    Decode video frames on a background thread
+    
+    Frames are decoded into buffers the writer thread has finished with. A new
+    buffer is only allocated when none is free, so the pool grows to the number
+    of frames in flight and then stays that size.
+    
+    Args:
+        cap: Opened cv2.VideoCapture (or NVDEC reader with the same interface)
+        frame_queue: Queue receiving decoded frames, then None at the end of the video
+        stop_event: Event set when processing should stop early, or set here if decoding fails
+        errors: Dictionary receiving a 'read' error message
+        free_frames: Queue of frame buffers that can be decoded into again
+    """
+    decode_in_place = isinstance(cap, cv2.VideoCapture)
+    try:
+        while not stop_event.is_set():
+            try:
+                buffer = free_frames.get_nowait()
+            except queue.Empty:
+                buffer = None
+            
+            # Every frame is decoded, even when detection skips it: skipped frames are still
+            # written to the output with the cached boxes, so grab() alone would drop them
+            ret, frame = cap.read(buffer) if decode_in_place else cap.read()
+            if not ret:
+                break
+            # Frames from FFmpeg pipes are read-only views, and boxes are drawn in place
+            if not frame.flags.writeable:
+                if buffer is not None and buffer.shape == frame.shape:
+                    np.copyto(buffer, frame)
+                    frame = buffer
+                else:
+                    frame = frame.copy()
+            if not queue_put(frame_queue, frame, stop_event):
+                return
+    except Exception as e:
+        # Stop the pipeline instead of leaving the script thread waiting for frames
+        errors['read'] = f"Error decoding the video: {e}"
+        stop_event.set()
+        return
+    queue_put(frame_queue, None, stop_event)
+
+def write_frames(writer, frame_queue, stop_event, errors, free_frames):
+    """
+    Draw detections on frames and feed them to FFmpeg on a background thread
+    
+    Streamlit calls only work on the script thread, so problems are recorded in
+    errors and reported once the thread has finished.
+    
+    Args:
+        writer: FFmpeg process returned by open_ffmpeg_writer
+        frame_queue: Queue of (frame, annotations) tuples, then None when done
+        stop_event: Event set when processing should stop early, or set here if FFmpeg
+            stops accepting frames
+        errors: Dictionary receiving 'annotate' and 'write' error messages
+        free_frames: Queue receiving frame buffers once they have been written
+    """
+    try:
+        while True:
+            item = queue_get(frame_queue, stop_event)
+            if item is None:
+                break
+            frame, annotations = item
+            
+            try:
+                draw_annotations(frame, annotations)
+            except Exception as e:
+                # Write the original frame if annotation fails
+                errors.setdefault('annotate', str(e))
+            
+            # Boxes were drawn into the decoded frame itself, so hand FFmpeg its buffer
+            # directly instead of copying it into a new bytes object first
+            writer.stdin.write(np.ascontiguousarray(frame))
+            
+            # The pipe has taken a copy of the frame, so the reader can decode into it again
+            free_frames.put(frame)
+    except OSError:
+        # A closed pipe raises BrokenPipeError, or EINVAL on Windows
+        errors['write'] = "FFmpeg stopped accepting frames; the output video is incomplete"
+        stop_event.set()
+    except Exception as e:
+        # Stop the pipeline instead of leaving the script thread blocked on a full queue
+        errors['write'] = f"Error writing the output video: {e}"
+        stop_event.set()
+
+def process_video(video_path, model, conf_threshold, show_labels, show_conf, process_every_nth_frame=1, batch_size=1,
+                  motion_threshold=None, max_skip=30, prefetch=FRAME_QUEUE_SIZE, progress_placeholder=None,
+                  use_nvdec=False):
     """
     Process video file with object detection
     
@@ -17,19 +263,25 @@ def process_video(video_path, model, conf_threshold, show_labels, show_conf, pro
         show_labels: Whether to show labels
         show_conf: Whether to show confidence scores
         process_every_nth_frame: Process every Nth frame to speed up inference
-        batch_size: Number of frames to process in a batch (for GPU acceleration)
+        batch_size: Number of frames sent to the model in a single inference call
+        motion_threshold: Skip detection on frames whose mean pixel change since the last
+            detected frame is below this value (None uses process_every_nth_frame instead)
+        max_skip: Maximum number of frames in a row skipped by the motion check
+        prefetch: Number of frames buffered between the decode, inference and encode threads
+        progress_placeholder: Optional st.empty() placeholder showing the processing rate
+        use_nvdec: Decode the video on an NVIDIA GPU with ffmpegcv instead of OpenCV
         
     Returns:
         tuple: (output_path, detection_stats)
     """
     # Create a temporary file for the output video
-    temp_output_path = tempfile.NamedTemporaryFile(delete=False, suffix='_temp.mp4').name
     final_output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
     
     # Get video properties
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         st.error("Could not open video file")
+        clean_up_temp_file(final_output_path)
         return None, None
         
     # Get video properties
@@ -38,169 +290,232 @@ def process_video(video_path, model, conf_threshold, show_labels, show_conf, pro
     fps = int(cap.get(cv2.CAP_PROP_FPS))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
-    # Create VideoWriter with mp4v codec (we'll convert it later)
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(temp_output_path, fourcc, fps, (frame_width, frame_height))
+    device = get_model_device(model)
+    if use_nvdec:
+        # Decode on the GPU to take H.264/HEVC decoding off the CPU; frames still come
+        # back to the host because they are annotated and encoded there
+        try:
+            nvdec_cap = open_nvdec_capture(video_path, gpu=device.index or 0)
+        except Exception as e:
+            st.warning(f"NVDEC decoding is not available, decoding on the CPU instead: {e}")
+        else:
+            cap.release()
+            cap = nvdec_cap
     
-    if not out.isOpened():
-        st.error("Failed to create output video writer")
+    # Encode annotated frames straight to web-compatible H.264 with FFmpeg
+    try:
+        writer, writer_log = open_ffmpeg_writer(final_output_path, frame_width, frame_height, fps)
+    except OSError as e:
+        st.error(f"Failed to start FFmpeg video writer: {e}")
+        cap.release()
+        clean_up_temp_file(final_output_path)
         return None, None
     
-    # Process the results
-    all_detections = []
-    
-    # Create a progress bar
-    progress_bar = stqdm(total=total_frames, desc="Processing video")
-    
-    # Process frame by frame
-    frame_count = 0
-    last_result = None
-    
-    # Check if model is using half precision
-    is_half_precision = False
-    if hasattr(model, 'model'):
-        if hasattr(model.model, 'fp16'):
-            is_half_precision = model.model.fp16
-        # Check if any parameter is in half precision
-        elif next(model.model.parameters()).dtype == torch.float16:
-            is_half_precision = True
-    
-    # If using half precision, ensure the model knows it
-    if is_half_precision and hasattr(model, 'model'):
-        model.model.fp16 = True
-    
-    # Check if processing should continue (for stop button functionality)
-    while cap.isOpened() and st.session_state.get('processing', True):
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        # Only process every Nth frame to speed up inference
-        if frame_count % process_every_nth_frame == 0:
-            try:
-                # Run detection on the frame with appropriate precision
-                if is_half_precision:
-                    # For half precision models, explicitly set half=True
-                    results = model(frame, conf=conf_threshold, half=True)
+    # Everything below runs in try/finally: Streamlit aborts a script run by raising
+    # from the next st.* call (Stop button, any widget change), and the threads, the
+    # capture and the FFmpeg process must not outlive the run
+    stop_event = threading.Event()
+    reader_thread = None
+    writer_thread = None
+    stopped_by_user = False
+    # Set once the writer has handed FFmpeg every frame; otherwise the output is discarded
+    finished = False
+    ffmpeg_errors = ""
+    reader_errors = {}
+    writer_errors = {}
+    
+    try:
+        # Running per-class statistics, updated once per detected frame
+        detection_stats = DetectionStats(get_class_names(model))
+        
+        # Process the video in batches of frames
+        batch_size = max(1, int(batch_size))
+        process_every_nth_frame = max(1, int(process_every_nth_frame))
+        frame_count = 0
+        frames_since_inference = 0
+        # Thumbnail of the last frame sent to the model, for the motion check
+        last_thumbnail = None
+        # Boxes from the most recent detection, redrawn on every frame until the next one
+        cached_annotations = []
+        
+        # Look up class names and colors once instead of per box
+        class_names = get_class_names(model)
+        class_colors = [colors(cls_id, True) for cls_id in range(len(class_names))]
+        
+        # Check if model is using half precision
+        is_half_precision = uses_half_precision(model)
+        
+        # If using half precision, ensure the model knows it
+        if is_half_precision and isinstance(getattr(model, 'model', None), torch.nn.Module):
+            model.model.fp16 = True
+        
+        # On CUDA, stage frames in pinned memory and copy them to the GPU asynchronously
+        uploader = None
+        if device.type == 'cuda':
+            input_shape = letterbox_shape(frame_height, frame_width)
+            uploader = PinnedFrameUploader(batch_size, device, input_shape, half=is_half_precision)
+            # Prime cuDNN and the allocator for this exact batch shape before the first frame
+            warmup_gpu(model, device, half=is_half_precision, batch_size=batch_size, input_shape=input_shape)
+        
+        # Create a progress bar
+        progress_bar = stqdm(total=total_frames, desc="Processing video")
+        
+        # Decode and encode on background threads so they overlap with inference.
+        # The model and all Streamlit calls stay on this (the script) thread.
+        # The queues need room for at least one full batch so the reader never stalls inference
+        prefetch = max(int(prefetch), batch_size)
+        decode_queue = queue.Queue(maxsize=prefetch)
+        encode_queue = queue.Queue(maxsize=prefetch)
+        # Written frames are recycled as decode buffers instead of allocating one per frame
+        free_frames = queue.Queue()
+        reader_thread = threading.Thread(
+            target=read_frames, args=(cap, decode_queue, stop_event, reader_errors, free_frames), daemon=True
+        )
+        writer_thread = threading.Thread(
+            target=write_frames, args=(writer, encode_queue, stop_event, writer_errors, free_frames), daemon=True
+        )
+        reader_thread.start()
+        writer_thread.start()
+        
+        # Frames read since the last batch was flushed, as (frame_index, frame, run_inference)
+        pending_frames = []
+        # Skipped frames wait in pending_frames too, so a full batch holds up to batch_size times
+        # the longest gap between detected frames. Past MAX_PENDING_BYTES a partial batch runs instead.
+        max_gap = max_skip + 1 if motion_threshold is not None else process_every_nth_frame
+        frame_bytes = max(frame_width * frame_height * 3, 1)
+        max_pending_frames = min(batch_size * max_gap, max(MAX_PENDING_BYTES // frame_bytes, batch_size))
+        # Frames from pending_frames that will be sent to the model in the next batch
+        inference_frames = []
+        reached_end = False
+        start_time = time.perf_counter()
+        last_progress_update = start_time
+        
+        # Check if processing should continue (for stop button functionality)
+        while not reached_end and not stop_event.is_set():
+            # Read frames until the batch is full, the memory cap is reached or the video ends
+            while len(inference_frames) < batch_size and len(pending_frames) < max_pending_frames:
+                if not st.session_state.get('processing', True):
+                    stopped_by_user = True
+                    stop_event.set()
+                frame = queue_get(decode_queue, stop_event)
+                if frame is None:
+                    reached_end = True
+                    break
+                
+                if motion_threshold is not None:
+                    # Only run detection when the scene changed since the last detected frame
+                    thumbnail = motion_thumbnail(frame)
+                    run_inference = (
+                        last_thumbnail is None
+                        or frames_since_inference >= max_skip
+                        or cv2.absdiff(thumbnail, last_thumbnail).mean() > motion_threshold
+                    )
+                    if run_inference:
+                        last_thumbnail = thumbnail
                 else:
-                    # For full precision models
-                    results = model(frame, conf=conf_threshold)
+                    # Only process every Nth frame to speed up inference. The check costs far
+                    # less than decoding the frame, which every output frame needs anyway.
+                    run_inference = frame_count % process_every_nth_frame == 0
+                frames_since_inference = 0 if run_inference else frames_since_inference + 1
+                pending_frames.append((frame_count, frame, run_inference))
+                if run_inference:
+                    inference_frames.append(frame)
+                frame_count += 1
+            
+            # Run detection on the whole batch in a single call
+            results = [None] * len(inference_frames)
+            if inference_frames:
+                try:
+                    with torch.inference_mode():
+                        if uploader is not None:
+                            # Preprocess into pinned memory and copy to the GPU asynchronously
+                            batch, letterbox_params = uploader.upload(inference_frames)
+                        else:
+                            # Preprocess the batch in a single OpenCV pass on the CPU
+                            blob, letterbox_params = frames_to_blob(inference_frames)
+                            batch = torch.from_numpy(blob)
+                        
+                        # Run on the preprocessed batch, then map boxes back to the frames
+                        results = predict_batch(model, batch, conf_threshold, half=is_half_precision)
+                        results = [
+                            restore_result(result, frame, ratio, pad)
+                            for result, frame, (ratio, pad) in zip(results, inference_frames, letterbox_params)
+                        ]
+                except Exception as e:
+                    st.error(f"Error processing frames {pending_frames[0][0]}-{pending_frames[-1][0]}: {e}")
+                    # Continue with last result if there's an error
+            results = iter(results)
+            
+            for frame_index, frame, run_inference in pending_frames:
+                if run_inference:
+                    result = next(results)
+                    if result is not None:
+                        boxes = result.boxes.cpu().numpy()
+                        
+                        # Store the annotations for reuse on the following frames
+                        cached_annotations = build_annotations(
+                            boxes, class_names, class_colors, show_labels, show_conf
+                        )
+                        
+                        # Collect detection stats for all boxes of the frame at once
+                        detection_stats.update(boxes.cls.astype(int), boxes.conf, frame_index / fps)
                 
-                last_result = results[0]  # Store the result for reuse
+                # Hand the frame to the writer thread, which draws the boxes and encodes it
+                if not queue_put(encode_queue, (frame, cached_annotations), stop_event):
+                    break
                 
-                # Collect detection stats
-                if len(last_result.boxes) > 0:
-                    boxes = last_result.boxes.cpu().numpy()
-                    
-                    for box in boxes:
-                        cls_id = int(box.cls[0])
-                        class_name = model.names.get(cls_id, f"Class {cls_id}") if hasattr(model, 'names') else f"Class {cls_id}"
-                        conf = float(box.conf[0])
-                        
-                        # Add to all detections
-                        all_detections.append({
-                            "Class": class_name,
-                            "Confidence": conf,
-                            "Frame": frame_count,
-                            "Time": frame_count / fps  # Add timestamp in seconds
-                        })
-            except Exception as e:
-                st.error(f"Error processing frame {frame_count}: {e}")
-                # Continue with last result if there's an error
-        
-        # Plot the results on the current frame
-        try:
-            if last_result is not None:
-                # Update the result's image to the current frame before plotting
-                original_img = last_result.orig_img  # Save the original image
-                last_result.orig_img = frame  # Replace with current frame
-                annotated_frame = last_result.plot(conf=show_conf, labels=show_labels, line_width=2)
-                last_result.orig_img = original_img  # Restore the original image
-            else:
-                # If we don't have any results yet, just use the current frame
-                annotated_frame = frame
+                # Update progress bar
+                progress_bar.update(1)
             
-            # Write the annotated frame to the output video
-            out.write(annotated_frame)
-        except Exception as e:
-            st.error(f"Error annotating frame {frame_count}: {e}")
-            # Write the original frame if annotation fails
-            out.write(frame)
+            pending_frames.clear()
+            inference_frames.clear()
+            
+            # Report the end-to-end rate; the slowest pipeline stage sets the pace
+            now = time.perf_counter()
+            if progress_placeholder is not None and now - last_progress_update >= PROGRESS_UPDATE_INTERVAL:
+                progress_placeholder.info(
+                    f"Processed {frame_count}/{total_frames} frames ({frame_count / (now - start_time):.1f} frames/s)"
+                )
+                last_progress_update = now
         
-        # Update progress bar
-        progress_bar.update(1)
-        frame_count += 1
-    
-    # Close progress bar
-    progress_bar.close()
+        # Close progress bar
+        progress_bar.close()
+        
+        if not stop_event.is_set():
+            # Let the writer drain its queue; it stops the pipeline itself if FFmpeg fails
+            queue_put(encode_queue, None, stop_event)
+            writer_thread.join()
+            finished = not stop_event.is_set()
+    finally:
+        # Stop the reader (and the writer, unless it already finished)
+        stop_event.set()
+        if not finished:
+            # Unblocks a writer stuck on a full pipe
+            writer.kill()
+        for thread in (reader_thread, writer_thread):
+            if thread is not None:
+                thread.join()
+        cap.release()
+        if not finished:
+            writer.communicate()
+            ffmpeg_errors = read_ffmpeg_log(writer_log)
+            clean_up_temp_file(final_output_path)
     
-    # Release resources
-    cap.release()
-    out.release()
+    if 'annotate' in writer_errors:
+        st.error(f"Error annotating frames: {writer_errors['annotate']}")
+    if not finished:
+        if 'read' in reader_errors:
+            st.error(reader_errors['read'])
+        if 'write' in writer_errors and not stopped_by_user:
+            st.error(f"{writer_errors['write']}: {ffmpeg_errors}" if ffmpeg_errors else writer_errors['write'])
+        return None, None
     
-    # Convert the video to a web-compatible format using FFmpeg
-    try:
-        with st.spinner("Converting video to web-compatible format..."):
-            # Command to convert video to H.264 with reasonable bitrate and web compatibility
-            cmd = [
-                'ffmpeg',
-                '-i', temp_output_path,  # Input file
-                '-c:v', 'libx264',       # H.264 codec
-                '-preset', 'fast',       # Encoding speed/compression tradeoff
-                '-crf', '23',            # Constant Rate Factor (quality) - lower is better
-                '-pix_fmt', 'yuv420p',   # Pixel format for maximum compatibility
-                '-movflags', '+faststart', # Optimize for web streaming
-                '-y',                    # Overwrite output file if it exists
-                final_output_path        # Output file
-            ]
-            
-            # Run the FFmpeg command
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            _, stderr = process.communicate()
-            
-            # Check if conversion was successful
-            if process.returncode != 0:
-                st.error(f"Error converting video: {stderr}")
-                # Fall back to the original output if conversion fails
-                final_output_path = temp_output_path
-            else:
-                # Clean up the temporary file
-                try:
-                    os.unlink(temp_output_path)
-                except Exception as e:
-                    st.warning(f"Could not remove temporary file: {e}")
-    except Exception as e:
-        st.error(f"Error during video conversion: {e}")
-        # Fall back to the original output if conversion fails
-        final_output_path = temp_output_path
+    # Let FFmpeg finish writing the file (communicate closes stdin first)
+    writer.communicate()
+    ffmpeg_errors = read_ffmpeg_log(writer_log)
+    if writer.returncode != 0:
+        st.error(f"FFmpeg failed to encode the output video: {ffmpeg_errors}")
+        return None, None
     
     # Convert detection statistics to DataFrame for display
-    if all_detections:
-        # Group by class and calculate average confidence
-        stats_df = pd.DataFrame(all_detections)
-        
-        # Add more detailed statistics
-        class_stats = stats_df.groupby('Class').agg(
-            Count=('Class', 'count'),
-            Avg_Confidence=('Confidence', 'mean'),
-            Min_Confidence=('Confidence', 'min'),
-            Max_Confidence=('Confidence', 'max'),
-            First_Seen=('Time', 'min'),
-            Last_Seen=('Time', 'max')
-        ).reset_index()
-        
-        # Format the values
-        class_stats['Avg_Confidence'] = class_stats['Avg_Confidence'].apply(lambda x: f"{x:.2f}")
-        class_stats['Min_Confidence'] = class_stats['Min_Confidence'].apply(lambda x: f"{x:.2f}")
-        class_stats['Max_Confidence'] = class_stats['Max_Confidence'].apply(lambda x: f"{x:.2f}")
-        class_stats['First_Seen'] = class_stats['First_Seen'].apply(lambda x: f"{x:.1f}s")
-        class_stats['Last_Seen'] = class_stats['Last_Seen'].apply(lambda x: f"{x:.1f}s")
-    else:
-        class_stats = pd.DataFrame(columns=['Class', 'Count', 'Avg_Confidence', 'Min_Confidence', 'Max_Confidence', 'First_Seen', 'Last_Seen'])
-    
-    return final_output_path, class_stats
+    return final_output_path, detection_stats.to_dataframe()
@@ -2,31 +2,34 @@ import streamlit as st
 import time
 import os
 import tempfile
-from io import BytesIO
 
-# Import from our modules
-from src.video_compression import compress_video
-from src.video_detection import process_video
+# Import from our modules (compression and detection are imported when a video is processed)
 from src.video_utils import (
     initialize_session_state, 
     reset_session_state, 
-    get_video_bytes_from_session,
-    create_temp_file_from_upload,
+    get_video_source_from_session,
+    store_upload_in_session,
+    is_nvdec_available,
+    get_keyframe_times,
+    is_nvenc_available,
+    probe_video,
     clean_up_temp_file
 )
 from src.video_ui import (
     render_video_upload_section,
     render_video_options_section,
+    render_frame_skip_options,
     render_processing_buttons,
     render_processing_progress,
     render_video_comparison_section,
+    can_sync_players,
     render_video_players,
     render_detection_stats,
     render_download_options,
     render_reset_button
 )
 
-def process_video_file(model, conf_threshold, show_labels, show_conf, process_every_nth_frame):
+def process_video_file(model, conf_threshold, show_labels, show_conf, default_batch_size=1):
     """
     Main function to handle video file upload and processing
     
@@ -35,7 +38,7 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
         conf_threshold: Confidence threshold
         show_labels: Whether to show labels
         show_conf: Whether to show confidence scores
-        process_every_nth_frame: Process every Nth frame to speed up inference
+        default_batch_size: Initially selected number of frames per inference call
     """
     # Initialize session state
     initialize_session_state()
@@ -43,20 +46,24 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
     # Render video upload section
     uploaded_file = render_video_upload_section()
     
-    # Store uploaded file in session state
+    # Save the uploaded file to disk once and keep only its path in session state
     if uploaded_file is not None:
-        if st.session_state.uploaded_file_data is None:
-            st.session_state.uploaded_file_data = uploaded_file.getvalue()
+        store_upload_in_session(uploaded_file)
     
     # If we have an uploaded file (either from this run or stored in session state)
-    if uploaded_file is not None or st.session_state.uploaded_file_data is not None:
-        # Create a temporary file to save the uploaded video if needed
-        video_path = None
-        if uploaded_file is not None:
-            video_path = create_temp_file_from_upload(uploaded_file)
+    if st.session_state.uploaded_file_path is not None:
+        # The stored file is used for processing and for playback of the original
+        video_path = st.session_state.uploaded_file_path
         
         # Render video options section
-        use_compression, target_resolution, target_fps, quality = render_video_options_section()
+        (
+            use_compression, target_resolution, target_fps, quality, use_hwaccel, use_nvdec, batch_size
+        ) = render_video_options_section(
+            nvdec_available=is_nvdec_available(),
+            nvenc_available=is_nvenc_available(),
+            default_batch_size=default_batch_size
+        )
+        process_every_nth_frame, motion_threshold, max_skip = render_frame_skip_options()
         
         # Only show processing buttons if we haven't processed a video yet
         if st.session_state.output_video_path is None:
@@ -76,8 +83,23 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
                 
                 process_video_path = video_path
                 
+                # Skip compression when it would not shrink the video: already H.264,
+                # no taller than the target resolution and no faster than the target FPS
+                if use_compression and video_path:
+                    video_info = probe_video(video_path)
+                    if (
+                        video_info is not None
+                        and video_info['codec_name'] == 'h264'
+                        and video_info['height'] <= target_resolution
+                        and video_info['fps'] <= target_fps
+                    ):
+                        use_compression = False
+                        st.info("Video already matches the compression settings, skipping compression.")
+                
                 # Compress video if option is selected
                 if use_compression and video_path:
+                    from src.video_compression import compress_video
+                    
                     with st.spinner("Compressing video..."):
                         compressed_video_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
                         compression_success = compress_video(
@@ -85,7 +107,8 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
                             compressed_video_path, 
                             resolution=target_resolution,
                             quality=quality,
-                            fps=target_fps
+                            fps=target_fps,
+                            use_hwaccel=use_hwaccel
                         )
                         
                         if compression_success:
@@ -97,6 +120,8 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
                             st.warning("Video compression failed. Using original video.")
                 
                 # Run inference on video
+                from src.video_detection import process_video
+                
                 with st.spinner("Processing video... This may take a while depending on the video length"):
                     # Create a progress placeholder
                     progress_placeholder = render_processing_progress("Starting video processing...")
@@ -108,15 +133,21 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
                         st.warning("Processing stopped by user")
                         st.stop()
                     
-                    # Process the video
+                    # Process the video; decoding and encoding run on background threads
+                    # so they overlap with inference on this thread
                     output_video_path, detection_stats = process_video(
-                        process_video_path, model, conf_threshold, show_labels, show_conf, process_every_nth_frame
+                        process_video_path, model, conf_threshold, show_labels, show_conf, process_every_nth_frame, batch_size,
+                        motion_threshold=motion_threshold, max_skip=max_skip,
+                        progress_placeholder=progress_placeholder, use_nvdec=use_nvdec
                     )
                     
                     # Store results in session state
                     st.session_state.output_video_path = output_video_path
                     st.session_state.detection_stats = detection_stats
                     st.session_state.processing_time = time.time() - start_time
+                    # Start times snap to keyframes so the players can seek without decoding a whole GOP
+                    if output_video_path is not None:
+                        st.session_state.keyframes = get_keyframe_times(output_video_path)
                     
                     # Reset processing state
                     st.session_state.processing = False
@@ -124,27 +155,31 @@ def process_video_file(model, conf_threshold, show_labels, show_conf, process_ev
                     # Display processing information
                     progress_placeholder.success(f"Processing completed in {st.session_state.processing_time:.2f} seconds")
                 
-                # Clean up temporary files
+                # Clean up temporary files (the original is kept for playback until reset)
                 if use_compression and 'compressed_video_path' in locals() and os.path.exists(compressed_video_path):
                     clean_up_temp_file(compressed_video_path)
-                
-                # Clean up the original video file
-                if video_path and os.path.exists(video_path):
-                    clean_up_temp_file(video_path)
         
         # Display results if we have processed a video (either in this run or a previous one)
         if st.session_state.output_video_path is not None and os.path.exists(st.session_state.output_video_path):
-            # Render video comparison section
-            sync_play = render_video_comparison_section(st.session_state.processing_time)
+            # Get the original video from session state
+            original_video_source = get_video_source_from_session()
+            
+            # Small videos share one synchronized player, larger ones get a player each
+            synced_players = can_sync_players(original_video_source, st.session_state.output_video_path)
             
-            # Get video bytes from session state
-            original_video_bytes = get_video_bytes_from_session()
+            # Render video comparison section
+            sync_play = render_video_comparison_section(
+                st.session_state.processing_time,
+                keyframes=st.session_state.keyframes,
+                synced_players=synced_players
+            )
             
             # Render video players
             render_video_players(
-                original_video_bytes, 
+                original_video_source, 
                 st.session_state.output_video_path, 
-                st.session_state.sync_time
+                st.session_state.sync_time,
+                synced_players=synced_players
             )
             
             # Render detection statistics
@@ -1,7 +1,80 @@
 import streamlit as st
+import streamlit.components.v1 as components
+import base64
 import time
 import os
-from io import BytesIO
+from src.utils import BATCH_SIZE_OPTIONS
+
+# Largest combined size of both videos that is embedded in the synchronized player
+SYNCED_PLAYER_MAX_BYTES = 32 * 1024 * 1024
+
+# Both videos in one component, driven by a single set of controls
+SYNCED_PLAYER_TEMPLATE = """
+<div style="display: flex; gap: 1rem; font-family: sans-serif;">
+  <div style="flex: 1;">
+    <p style="margin: 0 0 0.5rem 0; font-weight: 600;">Original Video</p>
+    <video id="original" src="{original_url}" playsinline preload="auto" style="width: 100%; max-height: 360px;"></video>
+  </div>
+  <div style="flex: 1;">
+    <p style="margin: 0 0 0.5rem 0; font-weight: 600;">Detection Results</p>
+    <video id="processed" src="{processed_url}" playsinline preload="auto" style="width: 100%; max-height: 360px;"></video>
+  </div>
+</div>
+<div style="display: flex; align-items: center; gap: 0.75rem; margin-top: 0.5rem; font-family: sans-serif;">
+  <button id="toggle" style="padding: 0.25rem 0.75rem;">&#9654; Play both</button>
+  <input id="seek" type="range" min="0" max="0" step="0.1" value="0" style="flex: 1;">
+  <span id="clock">0.0s</span>
+</div>
+<script>
+  const original = document.getElementById("original");
+  const processed = document.getElementById("processed");
+  const toggle = document.getElementById("toggle");
+  const seek = document.getElementById("seek");
+  const clock = document.getElementById("clock");
+  let loaded = 0;
+  
+  function seekBoth(time) {{
+    original.currentTime = time;
+    processed.currentTime = time;
+  }}
+  
+  [original, processed].forEach((video) => video.addEventListener("loadedmetadata", () => {{
+    if (++loaded === 2) {{
+      seek.max = Math.min(original.duration, processed.duration);
+      seekBoth({start_time});
+    }}
+  }}));
+  
+  toggle.addEventListener("click", () => {{
+    if (processed.paused) {{
+      original.currentTime = processed.currentTime;
+      original.play();
+      processed.play();
+      toggle.innerHTML = "&#10074;&#10074; Pause both";
+    }} else {{
+      original.pause();
+      processed.pause();
+      toggle.innerHTML = "&#9654; Play both";
+    }}
+  }});
+  
+  seek.addEventListener("input", () => seekBoth(Number(seek.value)));
+  
+  // The processed video is the clock; pull the original back if it drifts
+  processed.addEventListener("timeupdate", () => {{
+    seek.value = processed.currentTime;
+    clock.textContent = processed.currentTime.toFixed(1) + "s";
+    if (!processed.paused && Math.abs(original.currentTime - processed.currentTime) > 0.25) {{
+      original.currentTime = processed.currentTime;
+    }}
+  }});
+  
+  processed.addEventListener("ended", () => {{
+    original.pause();
+    toggle.innerHTML = "&#9654; Play both";
+  }});
+</script>
+"""
 
 def render_video_upload_section():
     """
@@ -12,15 +85,32 @@ def render_video_upload_section():
     """
     return st.file_uploader("Choose a video...", type=["mp4", "avi", "mov", "mkv"])
 
-def render_video_options_section():
+def render_video_options_section(nvdec_available=False, nvenc_available=False, default_batch_size=1):
     """
     Render the video processing options section
     
+    Args:
+        nvdec_available: Whether GPU (NVDEC) decoding can be offered
+        nvenc_available: Whether hardware accelerated (NVENC) compression can be offered
+        default_batch_size: Initially selected inference batch size
+    
     Returns:
-        tuple: (use_compression, target_resolution, target_fps, quality)
+        tuple: (use_compression, target_resolution, target_fps, quality, use_hwaccel, use_nvdec, batch_size)
     """
     with st.expander("Video Processing Options", expanded=True):
         use_compression = st.checkbox("Compress video before processing (faster)", value=True)
+        use_hwaccel = st.checkbox(
+            "Hardware acceleration (NVENC)",
+            value=nvenc_available,
+            disabled=not (use_compression and nvenc_available),
+            help="Compresses the video on the NVIDIA GPU. Disable to use the CPU encoder."
+        )
+        use_nvdec = st.checkbox(
+            "Use NVDEC (GPU video decoding)",
+            value=False,
+            disabled=not nvdec_available,
+            help="Decodes the video on the NVIDIA GPU to free up the CPU. Requires the ffmpegcv package."
+        )
         
         col1, col2 = st.columns(2)
         with col1:
@@ -47,8 +137,54 @@ def render_video_options_section():
             value=23,
             help="Higher value = lower quality but smaller file (18-28 recommended)"
         )
+        
+        batch_size = st.select_slider(
+            "Batch Size",
+            options=BATCH_SIZE_OPTIONS,
+            value=default_batch_size,
+            help="Number of frames sent to the model in a single inference call. "
+                 "Larger batches keep the GPU busy but use more memory."
+        )
+    
+    return use_compression, target_resolution, target_fps, quality, use_hwaccel, use_nvdec, batch_size
+
+def render_frame_skip_options():
+    """
+    Render the options that decide which frames are sent to the model
+    
+    Returns:
+        tuple: (process_every_nth_frame, motion_threshold, max_skip), motion_threshold is None
+            when static frames are not skipped
+    """
+    with st.expander("Frame Skipping Options", expanded=False):
+        skip_static_frames = st.checkbox(
+            "Skip static frames",
+            value=False,
+            help="Only run detection when the scene changes and reuse the previous boxes otherwise. "
+                 "Works well for fixed cameras and replaces the fixed Nth-frame setting."
+        )
+        process_every_nth_frame = st.slider(
+            "Process every Nth frame", 
+            1, 10, 1, 1, 
+            disabled=skip_static_frames,
+            help="Only run detection on every Nth frame to speed up processing. Higher values = faster processing "
+                 "but may miss fast-moving objects. The output video will maintain the original frame rate."
+        )
+        motion_threshold = None
+        max_skip = 30
+        if skip_static_frames:
+            motion_threshold = st.slider(
+                "Motion sensitivity threshold",
+                0.5, 20.0, 3.0, 0.5,
+                help="Average pixel change (0-255) needed to run detection again. Lower values = more detections."
+            )
+            max_skip = st.slider(
+                "Max frames to skip",
+                1, 120, 30, 1,
+                help="Run detection at least this often, even if the scene looks static"
+            )
     
-    return use_compression, target_resolution, target_fps, quality
+    return process_every_nth_frame, motion_threshold, max_skip
 
 def render_processing_buttons():
     """
@@ -85,12 +221,14 @@ def render_processing_progress(message):
     progress_placeholder.info(message)
     return progress_placeholder
 
-def render_video_comparison_section(processing_time):
+def render_video_comparison_section(processing_time, keyframes=None, synced_players=False):
     """
     Render the video comparison section
     
     Args:
         processing_time: Video processing time in seconds
+        keyframes: Keyframe times of the processed video in seconds (None for a plain slider)
+        synced_players: Whether the videos are shown in the synchronized player
     
     Returns:
         bool: Whether the sync button was clicked
@@ -100,19 +238,32 @@ def render_video_comparison_section(processing_time):
     # Simple layout for the sync button
     st.write("Use this button to play both videos at the same time:")
     sync_play = st.button("▶️ Play Both Videos Simultaneously", type="primary", key="sync_play")
-    start_time = st.slider(
-        "Start Time (seconds)", 
-        min_value=0.0, 
-        max_value=float(processing_time) if processing_time > 0 else 100.0,
-        value=0.0,
-        step=1.0,
-        key="sync_start_time"
-    )
+    if keyframes:
+        # Only offer keyframes: seeking to one doesn't require decoding from an earlier frame
+        start_time = st.select_slider(
+            "Start Time (seconds)",
+            options=keyframes,
+            value=keyframes[0],
+            format_func=lambda t: f"{t:.1f}",
+            key="sync_start_time"
+        )
+    else:
+        start_time = st.slider(
+            "Start Time (seconds)", 
+            min_value=0.0, 
+            max_value=float(processing_time) if processing_time > 0 else 100.0,
+            value=0.0,
+            step=1.0,
+            key="sync_start_time"
+        )
     
     # Update sync time when button is clicked
     if sync_play:
         st.session_state.sync_time = start_time
         st.success(f"Starting both videos at {start_time} seconds")
+        if synced_players:
+            # One set of controls plays both videos, no manual timing needed
+            return sync_play
         # Add a countdown to help users synchronize manual clicking
         countdown_placeholder = st.empty()
         for i in range(3, 0, -1):
@@ -122,26 +273,78 @@ def render_video_comparison_section(processing_time):
     
     return sync_play
 
-def render_video_players(original_video_bytes, processed_video_path, sync_time):
+def can_sync_players(original_video_source, processed_video_path):
+    """
+    Check whether both videos are small enough to embed in the synchronized player
+    
+    Args:
+        original_video_source: Path (or file-like object) of the original video
+        processed_video_path: Path to processed video
+        
+    Returns:
+        bool: True if both are files whose combined size is within SYNCED_PLAYER_MAX_BYTES
+    """
+    if not isinstance(original_video_source, str):
+        return False
+    total_size = os.path.getsize(original_video_source) + os.path.getsize(processed_video_path)
+    return total_size <= SYNCED_PLAYER_MAX_BYTES
+
+@st.cache_resource(max_entries=4)
+def video_data_url(video_path, modified_time):
+    """
+    Encode a video file as a data URL once per version instead of on every rerun
+    
+    Args:
+        video_path: Path to video file
+        modified_time: File modification time, so a rewritten file is encoded again
+        
+    Returns:
+        str: data:video/mp4;base64 URL
+    """
+    with open(video_path, "rb") as file:
+        return "data:video/mp4;base64," + base64.b64encode(file.read()).decode("ascii")
+
+def render_synced_video_players(original_video_path, processed_video_path, sync_time):
+    """
+    Render both videos in one HTML component with shared play, pause and seek controls
+    
+    Args:
+        original_video_path: Path to original video
+        processed_video_path: Path to processed video
+        sync_time: Start time for videos in seconds
+    """
+    html = SYNCED_PLAYER_TEMPLATE.format(
+        original_url=video_data_url(original_video_path, os.path.getmtime(original_video_path)),
+        processed_url=video_data_url(processed_video_path, os.path.getmtime(processed_video_path)),
+        start_time=float(sync_time)
+    )
+    components.html(html, height=440)
+
+def render_video_players(original_video_source, processed_video_path, sync_time, synced_players=False):
     """
     Render the original and processed video players
     
     Args:
-        original_video_bytes: BytesIO object containing original video
+        original_video_source: Path (or file-like object) of the original video
         processed_video_path: Path to processed video
         sync_time: Start time for videos in seconds
+        synced_players: Show both videos in one synchronized player (see can_sync_players)
     """
+    if synced_players:
+        render_synced_video_players(original_video_source, processed_video_path, sync_time)
+        return
+    
     # Display the original and processed videos side by side
     result_col1, result_col2 = st.columns(2)
     
     with result_col1:
         st.subheader("Original Video")
-        if original_video_bytes is not None:
-            st.video(original_video_bytes, start_time=int(sync_time))
+        if original_video_source is not None:
+            st.video(original_video_source, start_time=int(round(sync_time)))
     
     with result_col2:
         st.subheader("Detection Results")
-        st.video(processed_video_path, start_time=int(sync_time))
+        st.video(processed_video_path, start_time=int(round(sync_time)))
     
     # Add instructions for manual synchronization
     st.info("📝 **Note**: Due to browser security policies, videos can't be automatically played. "
@@ -164,36 +367,63 @@ def render_detection_stats(detection_stats, processing_time):
         basic_tab, detailed_tab = st.tabs(["Basic Stats", "Detailed Stats"])
         
         with basic_tab:
-            # Display simplified statistics
-            basic_stats = detection_stats[['Class', 'Count', 'Avg_Confidence']]
-            st.dataframe(basic_stats, use_container_width=True)
-            
-            # Summary visualization
-            st.subheader("Detection Summary")
-            cols = st.columns(min(len(detection_stats), 4))
-            for i, (_, row) in enumerate(detection_stats.iterrows()):
-                col_idx = i % len(cols)
-                cols[col_idx].metric(
-                    f"Total {row['Class']}s", 
-                    row['Count'],
-                    f"Avg conf: {row['Avg_Confidence']}"
-                )
+            # Display simplified statistics in a single table; confidence is drawn as a bar
+            basic_stats = detection_stats[['Class', 'Count', 'Avg_Confidence']].astype({'Avg_Confidence': float})
+            st.dataframe(
+                basic_stats,
+                column_config={
+                    'Count': st.column_config.NumberColumn("Count"),
+                    'Avg_Confidence': st.column_config.ProgressColumn(
+                        "Avg conf", format="%.2f", min_value=0, max_value=1
+                    )
+                },
+                use_container_width=True,
+                hide_index=True
+            )
         
         with detailed_tab:
             # Display all statistics
-            st.dataframe(detection_stats, use_container_width=True)
+            st.dataframe(detection_stats, use_container_width=True, hide_index=True)
             
-            # Add a timeline visualization if there are enough detections
-            if len(detection_stats) > 0:
-                st.subheader("Object Timeline")
-                st.write("When objects were first and last seen in the video:")
-                
-                # Create a simple timeline visualization
-                for _, row in detection_stats.iterrows():
-                    st.write(f"**{row['Class']}**: {row['First_Seen']} → {row['Last_Seen']}")
+            # When objects were first and last seen, as one table instead of a line per class
+            st.subheader("Object Timeline")
+            st.write("When objects were first and last seen in the video:")
+            st.dataframe(
+                detection_stats[['Class', 'First_Seen', 'Last_Seen']],
+                use_container_width=True,
+                hide_index=True
+            )
     else:
         st.info("No objects detected in the video.")
 
+@st.cache_data(max_entries=4)
+def stats_to_csv_bytes(detection_stats):
+    """
+    Serialize detection statistics to CSV once instead of on every rerun
+    
+    Args:
+        detection_stats: DataFrame containing detection statistics
+        
+    Returns:
+        bytes: UTF-8 encoded CSV
+    """
+    return detection_stats.to_csv(index=False).encode('utf-8')
+
+@st.cache_resource(max_entries=2)
+def read_video_bytes(video_path, modified_time):
+    """
+    Read a video file once per version instead of on every rerun
+    
+    Args:
+        video_path: Path to video file
+        modified_time: File modification time, so a rewritten file is read again
+        
+    Returns:
+        bytes: File contents
+    """
+    with open(video_path, "rb") as file:
+        return file.read()
+
 def render_download_options(processed_video_path, detection_stats):
     """
     Render download options for processed video and stats
@@ -204,20 +434,19 @@ def render_download_options(processed_video_path, detection_stats):
     """
     # Option to download the processed video
     if processed_video_path and os.path.exists(processed_video_path):
-        with open(processed_video_path, "rb") as file:
-            st.download_button(
-                label="Download Processed Video",
-                data=file,
-                file_name="processed_video.mp4",
-                mime="video/mp4",
-                key="download-video"
-            )
+        st.download_button(
+            label="Download Processed Video",
+            data=read_video_bytes(processed_video_path, os.path.getmtime(processed_video_path)),
+            file_name="processed_video.mp4",
+            mime="video/mp4",
+            key="download-video"
+        )
     
     # Option to download detection stats as CSV
     if detection_stats is not None and not detection_stats.empty:
         st.download_button(
             "Download Results as CSV",
-            detection_stats.to_csv(index=False).encode('utf-8'),
+            stats_to_csv_bytes(detection_stats),
             "video_detection_results.csv",
             "text/csv",
             key='download-video-csv'
@@ -1,21 +1,47 @@
 
 import os
+import json
+import shutil
 import tempfile
+import subprocess
+import functools
+import importlib.util
 import streamlit as st
-from io import BytesIO
+import torch
+from fractions import Fraction
+
+# Chunk size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+# Buffer size of the pipe feeding raw frames to FFmpeg
+PIPE_BUFFER_SIZE = 1 << 20
+# Initial values of the video processing session state
+SESSION_STATE_DEFAULTS = {
+    'processing': False,
+    'sync_time': 0,
+    'output_video_path': None,
+    'detection_stats': None,
+    'processing_time': 0,
+    'uploaded_file_path': None,
+    'uploaded_file_id': None,
+    'keyframes': None
+}
 
 def create_temp_file_from_upload(uploaded_file):
     """
     Create a temporary file from an uploaded file
     
+    The upload is streamed to disk in chunks instead of being copied into a
+    single bytes object first.
+    
     Args:
         uploaded_file: Streamlit uploaded file object
         
     Returns:
         str: Path to temporary file
     """
+    uploaded_file.seek(0)
     with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
+        shutil.copyfileobj(uploaded_file, tmp_file, UPLOAD_CHUNK_SIZE)
         return tmp_file.name
 
 def clean_up_temp_file(file_path):
@@ -36,41 +62,242 @@ def clean_up_temp_file(file_path):
         st.error(f"Error cleaning up temporary file: {e}")
         return False
 
-def get_video_bytes_from_session():
+@functools.lru_cache(maxsize=None)
+def is_nvenc_available():
+    """
+    Check whether FFmpeg can encode H.264 on an NVIDIA GPU (NVENC)
+    
+    FFmpeg builds list h264_nvenc even when the driver or GPU cannot run it, so a
+    single small frame is encoded to check (once per process).
+    
+    Returns:
+        bool: True if a CUDA GPU is present and FFmpeg can encode with h264_nvenc
+    """
+    if not torch.cuda.is_available():
+        return False
+    cmd = [
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-f', 'lavfi',
+        '-i', 'color=size=256x256:rate=1',  # Generated test frame
+        '-frames:v', '1',
+        '-c:v', 'h264_nvenc',
+        '-f', 'null',
+        '-'
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True)
+    except OSError:
+        return False
+    return result.returncode == 0
+
+def is_nvdec_available():
+    """
+    Check whether videos can be decoded on an NVIDIA GPU (NVDEC)
+    
+    Returns:
+        bool: True if a CUDA GPU is present and the optional ffmpegcv package is installed
+    """
+    return torch.cuda.is_available() and importlib.util.find_spec("ffmpegcv") is not None
+
+def open_nvdec_capture(video_path, gpu=0):
+    """
+    Open a video for decoding on the GPU's NVDEC block
+    
+    Args:
+        video_path: Path to video file
+        gpu: Index of the GPU used for decoding
+        
+    Returns:
+        ffmpegcv reader with the cv2.VideoCapture read()/release() interface
+    """
+    # Optional dependency, only imported when NVDEC decoding is requested
+    import ffmpegcv
+    return ffmpegcv.VideoCaptureNV(video_path, pix_fmt='bgr24', gpu=gpu)
+
+def probe_video(video_path):
+    """
+    Read the first video stream's properties with ffprobe
+    
+    Args:
+        video_path: Path to video file
+        
+    Returns:
+        dict: width, height, fps and codec_name, or None if the file could not be probed
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,avg_frame_rate,codec_name',
+        '-of', 'json',
+        video_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        stream = json.loads(result.stdout)['streams'][0]
+        # avg_frame_rate is a fraction such as "30000/1001" ("0/0" when unknown)
+        rate = stream.get('avg_frame_rate', '0/0')
+        fps = float(Fraction(rate)) if not rate.endswith('/0') else 0.0
+        return {
+            'width': int(stream['width']),
+            'height': int(stream['height']),
+            'fps': fps,
+            'codec_name': stream.get('codec_name')
+        }
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+        return None
+
+def get_keyframe_times(video_path):
+    """
+    List the keyframe timestamps of a video's first stream with ffprobe
+    
+    Only packet headers are read, so this is fast even for long videos.
+    
+    Args:
+        video_path: Path to video file
+        
+    Returns:
+        list: Keyframe times in seconds, or None if the file could not be probed
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(round(float(pts_time), 2))
+    return sorted(keyframes) or None
+
+def open_ffmpeg_writer(output_path, width, height, fps):
+    """
+    Start an FFmpeg process that encodes raw BGR frames from stdin to H.264
+    
+    Args:
+        output_path: Path to output video
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Output frame rate
+        
+    Returns:
+        tuple: (FFmpeg process, write frames to its stdin; log file for read_ffmpeg_log)
+    """
+    if is_nvenc_available():
+        # Offload encoding to the GPU's NVENC block. -cq only sets the quality in VBR
+        # mode, and -b:v 0 removes the default bitrate cap
+        codec_args = [
+            '-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0', '-no-scenecut', '1'
+        ]
+    else:
+        codec_args = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23', '-sc_threshold', '0']
+    
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-f', 'rawvideo',              # Raw frames on stdin
+        '-pix_fmt', 'bgr24',           # OpenCV frame layout
+        '-s', f'{width}x{height}',     # Frame size
+        '-r', str(fps),                # Frame rate
+        '-i', '-',                     # Read from stdin
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # yuv420p needs even dimensions
+        *codec_args,                   # H.264 encoder, without extra keyframes at scene cuts
+        '-g', str(max(fps, 1)),        # One keyframe per second, for seeking
+        '-pix_fmt', 'yuv420p',         # Pixel format for maximum compatibility
+        '-movflags', '+faststart',     # Optimize for web streaming
+        '-y',                          # Overwrite output file if it exists
+        output_path                    # Output file
+    ]
+    # Errors go to a temporary file rather than a pipe: nothing reads stderr while frames
+    # are written, and a full pipe would block FFmpeg (and with it the writes)
+    log_file = tempfile.TemporaryFile()
+    try:
+        # A large buffer batches small frames into fewer write syscalls; frames bigger
+        # than the buffer are written straight through without an extra copy
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=log_file, bufsize=PIPE_BUFFER_SIZE)
+        return process, log_file
+    except OSError:
+        log_file.close()
+        raise
+
+def read_ffmpeg_log(log_file):
+    """
+    Read and close the log file FFmpeg wrote its errors to
+    
+    Args:
+        log_file: Temporary file passed to FFmpeg as stderr
+        
+    Returns:
+        str: FFmpeg's error messages
+    """
+    with log_file:
+        log_file.seek(0)
+        return log_file.read().decode(errors='replace').strip()
+
+def store_upload_in_session(uploaded_file):
     """
-    Get video bytes from session state
+    Save an uploaded video to disk once and remember its path in session state
+    
+    A new upload replaces (and deletes) the previously stored file and clears the
+    results of the previous video.
+    
+    Args:
+        uploaded_file: Streamlit uploaded file object
+        
+    Returns:
+        str: Path to the stored video file
+    """
+    upload_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    if st.session_state.uploaded_file_path is None or st.session_state.uploaded_file_id != upload_id:
+        if st.session_state.uploaded_file_path is not None:
+            clean_up_temp_file(st.session_state.uploaded_file_path)
+        # The stored results belong to the previous video
+        st.session_state.update({
+            key: value for key, value in SESSION_STATE_DEFAULTS.items()
+            if key not in ('processing', 'uploaded_file_path', 'uploaded_file_id')
+        })
+        st.session_state.uploaded_file_path = create_temp_file_from_upload(uploaded_file)
+        st.session_state.uploaded_file_id = upload_id
+    return st.session_state.uploaded_file_path
+
+def get_video_source_from_session():
+    """
+    Get the stored original video from session state
+    
+    Only the path is kept, so the video stays on disk instead of in the
+    session's memory; st.video reads it from there.
     
     Returns:
-        BytesIO: BytesIO object containing video data or None
+        str: Path to the original video file or None
     """
-    if st.session_state.uploaded_file_data is not None:
-        return BytesIO(st.session_state.uploaded_file_data)
+    path = st.session_state.uploaded_file_path
+    if path is not None and os.path.exists(path):
+        return path
     return None
 
 def initialize_session_state():
     """
     Initialize session state variables for video processing
     """
-    if 'processing' not in st.session_state:
-        st.session_state.processing = False
-    if 'sync_time' not in st.session_state:
-        st.session_state.sync_time = 0
-    if 'output_video_path' not in st.session_state:
-        st.session_state.output_video_path = None
-    if 'detection_stats' not in st.session_state:
-        st.session_state.detection_stats = None
-    if 'processing_time' not in st.session_state:
-        st.session_state.processing_time = 0
-    if 'uploaded_file_data' not in st.session_state:
-        st.session_state.uploaded_file_data = None
+    for key, value in SESSION_STATE_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
 
 def reset_session_state():
     """
     Reset session state variables for video processing
     """
-    st.session_state.output_video_path = None
-    st.session_state.detection_stats = None
-    st.session_state.processing_time = 0
-    st.session_state.uploaded_file_data = None
-    st.session_state.sync_time = 0
-
+    # Delete the stored upload now that nothing plays it anymore
+    if st.session_state.uploaded_file_path is not None:
+        clean_up_temp_file(st.session_state.uploaded_file_path)
+    st.session_state.update({key: value for key, value in SESSION_STATE_DEFAULTS.items() if key != 'processing'})